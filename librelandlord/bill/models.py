@@ -63,6 +63,12 @@ class MeterReading(models.Model):
     meter_reading = models.DecimalField(
         max_digits=15, decimal_places=2, verbose_name=_("Meter Reading"))
 
+    class Meta:
+        # Zählerstände werden immer pro Zähler über einen Zeitraum gesucht
+        indexes = [
+            models.Index(fields=['meter', 'date'])
+        ]
+
     def __str__(self):
         return f"{str(self.meter)} {self.meter_reading}"
 # Define a model for consumption calculation.
@@ -0,0 +1,24 @@
+import uuid
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Apartment, HeatingInfo, Renter
+
+# Teil des Cache-Keys aller gecachten Heizinfos, wird bei Änderungen neu gesetzt
+HEATING_INFO_GENERATION_KEY = 'heating_info_generation'
+
+
+def get_heating_info_generation() -> str:
+    return cache.get_or_set(HEATING_INFO_GENERATION_KEY,
+                            lambda: uuid.uuid4().hex, None)
+
+
+@receiver([post_save, post_delete], sender=HeatingInfo)
+@receiver([post_save, post_delete], sender=Renter)
+@receiver([post_save, post_delete], sender=Apartment)
+def invalidate_heating_info_cache(sender, **kwargs):
+    # Die Heizinfo enthält Verbrauchs-, Mieter- und Wohnungsdaten, daher
+    # werden bei jeder Änderung daran alle gecachten Heizinfos verworfen
+    cache.set(HEATING_INFO_GENERATION_KEY, uuid.uuid4().hex, None)
@@ -1,3 +1,73 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Apartment, HeatingInfo, Renter
+from .views import get_heating_info_context
+
+
+def months_ago(months: int) -> tuple:
+    # Jahr und Monat, der um months Monate vor dem aktuellen Monat liegt
+    today = date.today()
+    month_index = today.year * 12 + today.month - 1 - months
+    return month_index // 12, month_index % 12 + 1
+
+
+class HeatingInfoContextTest(TestCase):
+    def setUp(self):
+        self.apartment = Apartment.objects.create(
+            number='1', name='Ost', street='Hauptstr. 1', postal_code='12345',
+            city='Stadt', size_in_m2=Decimal('50'))
+        self.other_apartment = Apartment.objects.create(
+            number='2', name='West', street='Hauptstr. 1', postal_code='12345',
+            city='Stadt', size_in_m2=Decimal('60'))
+        self.renter = Renter.objects.create(
+            apartment=self.apartment, first_name='Erika', last_name='Muster',
+            move_in_date=date(2020, 1, 1))
+        # 24 Monate bis einschließlich Vormonat, Warmwasser nur in
+        # ungeraden Monaten, die andere Wohnung mit deutlich höheren Werten
+        for months in range(1, 25):
+            year, month = months_ago(months)
+            HeatingInfo.objects.create(
+                apartment=self.apartment, year=year, month=month,
+                heating_energy_kwh=Decimal(months),
+                compare_heating_energy_kwh=Decimal(50),
+                hot_water_energy_kwh=Decimal(100 + months) if months % 2 else None,
+                compare_hot_water_energy_kwh=Decimal(120))
+            HeatingInfo.objects.create(
+                apartment=self.other_apartment, year=year, month=month,
+                heating_energy_kwh=Decimal(1000 + months),
+                hot_water_energy_kwh=Decimal(2000 + months))
+
+    def test_hot_water_rows(self):
+        context = get_heating_info_context(None, renter_id=self.renter.id)
+        hot_water = context['hot_water']
+        # Nur die Monate mit Warmwasserwert der letzten 12 Monate
+        self.assertEqual([row['actual'] for row in hot_water],
+                         [Decimal(100 + months) for months in range(1, 13, 2)])
+        first = hot_water[0]
+        year, month = months_ago(1)
+        self.assertEqual((first['date'].year, first['date'].month), (year, month))
+        self.assertEqual(first['compare'], Decimal(120))
+        self.assertEqual(first['year_before'], Decimal(113))
+        self.assertIsNotNone(first['actual_percent'])
+        self.assertIsNotNone(first['compare_percent'])
+
+    def test_moved_out_renter_returns_none(self):
+        self.renter.move_out_date = date.today().replace(day=1) - timedelta(days=40)
+        self.renter.save()
+        self.assertIsNone(get_heating_info_context(
+            None, renter_id=self.renter.id))
+
+    def test_apartment_isolation_and_year_before(self):
+        context = get_heating_info_context(None, renter_id=self.renter.id)
+        heating = context['heating']
+        self.assertEqual(context['apartment'], self.apartment)
+        # Keine Werte der anderen Wohnung, jeder Monat mit dem Vorjahresmonat
+        self.assertEqual([row['actual'] for row in heating],
+                         [Decimal(months) for months in range(1, 13)])
+        self.assertEqual([row['year_before'] for row in heating],
+                         [Decimal(months + 12) for months in range(1, 13)])
+        # Balken werden nur an den Werten der eigenen Wohnung skaliert
+        self.assertTrue(all(row['actual_percent'] < 100 for row in heating))
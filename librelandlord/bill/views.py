@@ -1,16 +1,29 @@
 from django.shortcuts import render
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse
 from django.template import loader
 from .models import Renter, HeatingInfo, Apartment
+from .signals import get_heating_info_generation
 from weasyprint import HTML
 from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q
+from django.utils import translation
 from datetime import datetime, timedelta
+from itertools import zip_longest
 import decimal
+import io
+import tempfile
 
 
 def index(request):
-    renter_list = Renter.objects.order_by('last_name')
+    # Wohnung mitladen und nur die Felder, die die Übersicht anzeigt.
+    # Achtung: Die Liste in only() muss von Hand mit index.html synchron
+    # gehalten werden, sonst löst jedes weitere Feld im Template pro Mieter
+    # eine zusätzliche Abfrage aus
+    renter_list = Renter.objects.select_related('apartment').only(
+        'first_name', 'last_name', 'alt_street', 'postal_code', 'city',
+        'apartment__number', 'apartment__name', 'apartment__street',
+        'apartment__postal_code', 'apartment__city').order_by('last_name')
     template = loader.get_template('index.html')
     context = {
         'renter_list': renter_list
@@ -22,19 +35,35 @@ def to_datetime(date):
     return datetime(year=date.year, month=date.month, day=date.day)
 
 
+# Der größte Wert nimmt nur 1/1.4 der Balkenbreite ein
+MAX_FACTOR = decimal.Decimal('1.4')
+
+
 def calculate_max(value: decimal.Decimal, current_max: decimal.Decimal) -> decimal.Decimal:
-    max_factor = decimal.Decimal(1.4)
     if value:
-        return max(current_max, value * max_factor)
+        return max(current_max, value * MAX_FACTOR)
     else:
         return current_max
 
 
+def column_max(entries: list, *fields: str) -> decimal.Decimal:
+    return max((entry[field] for entry in entries for field in fields
+                if entry[field] is not None), default=None)
+
+
 def get_heating_info_context(request, renter_id: int):
-    renter = Renter.objects.get(id=renter_id)
+    # Mieter und Wohnung in einer Abfrage laden
+    renter = Renter.objects.select_related('apartment').only(
+        'first_name', 'last_name', 'move_in_date', 'move_out_date',
+        'apartment__number', 'apartment__name', 'apartment__street',
+        'apartment__postal_code', 'apartment__city').get(id=renter_id)
     today = datetime.now()
     first_day_of_current_month = today.replace(day=1)
     last_day_of_last_month = first_day_of_current_month - timedelta(days=1)
+    if renter.move_out_date is not None and renter.move_out_date < last_day_of_last_month.date():
+        # Keinen Context zurückgeben, Mieter braucht für diesen Monat keine Heating Info
+        return None
+
     end_date_year = last_day_of_last_month.year
     end_date_month = last_day_of_last_month.month
     start_date_year = first_day_of_current_month.year-2
@@ -49,59 +78,70 @@ def get_heating_info_context(request, renter_id: int):
             else:
                 start_date_month = 1
                 start_date_year = start_date_year+1
-    if renter.move_out_date is not None and renter.move_out_date < last_day_of_last_month:
-        # Keinen Context zurückgeben, Mieter braucht für diesen Monat keine Heating Info
-        return None
 
     # Abfrage durchführen
-    heating_info_entries = HeatingInfo.objects.filter(
+    # Nur Einträge der Wohnung des Mieters, damit der Index
+    # (apartment, year, month) genutzt werden kann. Die Werte werden als
+    # dicts geladen und einmalig ausgewertet, da unten mehrfach per Index
+    # zugegriffen wird
+    heating_info_entries = list(HeatingInfo.objects.filter(
         Q(year=start_date_year, month__gte=start_date_month) | Q(
-            year__gt=start_date_year)  # Bedingung kombinieren
-    ).order_by('year', 'month').reverse()  # Ergebnisse nach Jahr und Monat sortieren
+            year__gt=start_date_year),  # Bedingung kombinieren
+        apartment_id=renter.apartment_id,
+    ).order_by('-year', '-month').values(  # Neueste Einträge zuerst
+        'year', 'month', 'heating_energy_kwh', 'compare_heating_energy_kwh',
+        'hot_water_energy_kwh', 'compare_hot_water_energy_kwh'))
+
+    # Maxima für die Skalierung der Balken aus denselben Zeilen bestimmen
+    max_heating = calculate_max(column_max(
+        heating_info_entries, 'heating_energy_kwh', 'compare_heating_energy_kwh'), 100)
+    max_water = calculate_max(column_max(
+        heating_info_entries, 'hot_water_energy_kwh', 'compare_hot_water_energy_kwh'), 100)
+
+    # Skalierung der Balken einmal berechnen, statt pro Wert durch das
+    # Maximum zu teilen. Die Prozentwerte dienen nur der Balkenbreite und
+    # brauchen keine Decimal-Genauigkeit
+    heating_scale = 100 / float(max_heating)
+    water_scale = 100 / float(max_water)
 
     heating = []
     hot_water = []
-    max_heating = 100
-    max_water = 100
-    for ele in heating_info_entries:
-        max_heating = calculate_max(ele.heating_energy_kwh, max_heating)
-        max_heating = calculate_max(
-            ele.compare_heating_energy_kwh, max_heating)
-        max_water = calculate_max(ele.hot_water_energy_kwh, max_water)
-        max_water = calculate_max(ele.compare_hot_water_energy_kwh, max_water)
-
-    for i in range(12):
-        if len(heating_info_entries) > i:
-            entry = heating_info_entries[i]
-            heating_year_before = None
-            if len(heating_info_entries) >= i+12:
-                heating_year_before = heating_info_entries[i +
-                                                           12].heating_energy_kwh
-                water_year_before = heating_info_entries[i +
-                                                         12].hot_water_energy_kwh
-            if entry.heating_energy_kwh is not None:
-                comp_percent = None
-                if entry.compare_heating_energy_kwh:
-                    comp_percent = 100 * \
-                        (entry.compare_heating_energy_kwh/max_heating)
-                date = datetime(year=entry.year, month=entry.month, day=1)
-                heating.append({
-                    'date': date,
-                    'actual': entry.heating_energy_kwh,
-                    'year_before': heating_year_before,
-                    'compare': entry.compare_heating_energy_kwh,
-                    'actual_percent': 100 * (entry.heating_energy_kwh/max_heating),
-                    'compare_percent': comp_percent
-                })
-            if entry.hot_water_energy_kwh is not None:
-                hot_water.append({
-                    'date': date,
-                    'actual': entry.hot_water_energy_kwh,
-                    'year_before': water_year_before,
-                    'compare': entry.compare_hot_water_energy_kwh,
-                    'actual_percent': 100 * (entry.hot_water_energy/max_water),
-                    'compare_percent': 100 * (entry.compare_hot_water_energy_kwh/max_water),
-                })
+    # Jeder der letzten 12 Monate wird mit dem gleichen Monat des Vorjahres
+    # (12 Einträge später) gepaart
+    for entry, entry_year_before in zip_longest(heating_info_entries[:12],
+                                                heating_info_entries[12:24]):
+        heating_year_before = None
+        water_year_before = None
+        if entry_year_before is not None:
+            heating_year_before = entry_year_before['heating_energy_kwh']
+            water_year_before = entry_year_before['hot_water_energy_kwh']
+        date = datetime(year=entry['year'], month=entry['month'], day=1)
+        if entry['heating_energy_kwh'] is not None:
+            comp_percent = None
+            if entry['compare_heating_energy_kwh']:
+                comp_percent = float(
+                    entry['compare_heating_energy_kwh']) * heating_scale
+            heating.append({
+                'date': date,
+                'actual': entry['heating_energy_kwh'],
+                'year_before': heating_year_before,
+                'compare': entry['compare_heating_energy_kwh'],
+                'actual_percent': float(entry['heating_energy_kwh']) * heating_scale,
+                'compare_percent': comp_percent
+            })
+        if entry['hot_water_energy_kwh'] is not None:
+            comp_percent = None
+            if entry['compare_hot_water_energy_kwh']:
+                comp_percent = float(
+                    entry['compare_hot_water_energy_kwh']) * water_scale
+            hot_water.append({
+                'date': date,
+                'actual': entry['hot_water_energy_kwh'],
+                'year_before': water_year_before,
+                'compare': entry['compare_hot_water_energy_kwh'],
+                'actual_percent': float(entry['hot_water_energy_kwh']) * water_scale,
+                'compare_percent': comp_percent,
+            })
 
     context = {
         'renter': renter,
@@ -114,24 +154,52 @@ def get_heating_info_context(request, renter_id: int):
     return context
 
 
-def heating_info(request):
-    template = loader.get_template('heating_info.html')
-    context = get_heating_info_context(request=request, renter_id=2)
-    html = template.render(context, request)
-    return HttpResponse(html)
+def get_heating_info_cache_key(kind: str, renter_id: int) -> str:
+    # Die Heizinfo ändert sich nur mit dem Monat, der Sprache oder wenn
+    # Verbrauchs-, Mieter- oder Wohnungsdaten geändert werden (siehe signals)
+    return (f"heating_info_{kind}:{renter_id}:{datetime.now():%Y-%m}:"
+            f"{translation.get_language()}:{get_heating_info_generation()}")
 
 
-def heating_info_pdf(request):
+# PDFs bis zu dieser Größe bleiben im Speicher und werden gecacht
+PDF_SPOOL_SIZE = 1024 * 1024
+
+
+def render_heating_info(request, renter_id: int) -> str:
     template = loader.get_template('heating_info.html')
-    context = get_heating_info_context(request=request, renter_id=2)
-    html = template.render(context, request)
+    context = get_heating_info_context(request=request, renter_id=renter_id)
+    return template.render(context, request)
 
-    # Generiere das PDF mit WeasyPrint
-    pdf = HTML(string=html).write_pdf()
 
-    # Sende die PDF-Datei als HTTP-Antwort zurück
-    response = HttpResponse(pdf, content_type='application/pdf')
-    # response['Content-Disposition'] = 'attachment; filename="heating_info.pdf"'
-    response['Content-Disposition'] = 'inline; filename="heating_info.pdf"'
+def heating_info(request):
+    renter_id = 2
+    cache_key = get_heating_info_cache_key('html', renter_id)
+    html = cache.get(cache_key)
+    if html is None:
+        html = render_heating_info(request, renter_id)
+        cache.set(cache_key, html)
+    return HttpResponse(html)
+
 
-    return response
+def heating_info_pdf(request):
+    renter_id = 2
+    cache_key = get_heating_info_cache_key('pdf', renter_id)
+    pdf = cache.get(cache_key)
+    if pdf is not None:
+        pdf_file = io.BytesIO(pdf)
+    else:
+        html = render_heating_info(request, renter_id)
+
+        # Generiere das PDF mit WeasyPrint direkt in eine temporäre Datei,
+        # die erst ab PDF_SPOOL_SIZE auf die Platte ausgelagert wird
+        pdf_file = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_SIZE)
+        HTML(string=html).write_pdf(target=pdf_file)
+        if pdf_file.tell() <= PDF_SPOOL_SIZE:
+            pdf_file.seek(0)
+            cache.set(cache_key, pdf_file.read())
+        pdf_file.seek(0)
+
+    # Sende die PDF-Datei blockweise als HTTP-Antwort zurück
+    # as_attachment=True würde das PDF herunterladen statt es anzuzeigen
+    return FileResponse(pdf_file, content_type='application/pdf',
+                        filename='heating_info.pdf')